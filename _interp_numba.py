@@ -0,0 +1,31 @@
+import numpy as np
+from numba import njit
+
+@njit(cache=True)
+def _interp_kernel(t, v, slope, q):
+    """
+    Linearly interpolates the queries q against the sorted times t and values v,
+    clamping to the first/last value outside of the range of t and returning NaN
+    for NaN queries (like np.interp)
+    
+    slope holds the precomputed slopes between consecutive samples of t and v
+    """
+    n = t.shape[0]
+    out = np.empty_like(q)
+    
+    for i in range(q.shape[0]):
+        if np.isnan(q[i]):
+            out[i] = np.nan
+            continue
+        
+        right = np.searchsorted(t, q[i], side='right')
+        
+        if right == n:
+            out[i] = v[n-1]
+        elif right == 0:
+            out[i] = v[0]
+        else:
+            left = right - 1
+            out[i] = v[left] + (q[i] - t[left]) * slope[left]
+            
+    return out
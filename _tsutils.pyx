@@ -0,0 +1,82 @@
+# cython: boundscheck=False, wraparound=False, cdivision=True
+"""
+Optional compiled kernel for TimeSeries.interpolate, built in place with 
+e.g. `cythonize -i _tsutils.pyx`. When it is not built, timeseries falls 
+back to the numba kernel and then to NumPy.
+"""
+import numpy as np
+cimport cython
+from libc.math cimport isnan, NAN
+
+cdef inline Py_ssize_t _search_right(const double[::1] t, double x, Py_ssize_t base, 
+                                     Py_ssize_t end) noexcept nogil:
+    """
+    Returns the index of the first time in t[base:end] greater than x (or end), 
+    like searchsorted with side='right'; the halving loop has no data-dependent 
+    branch, so it compiles to conditional moves
+    """
+    cdef Py_ssize_t length = end - base, half
+    
+    if length <= 0:
+        return base
+    
+    while length > 1:
+        half = length >> 1
+        base = base + half if t[base + half] <= x else base
+        length -= half
+        
+    return base + (t[base] <= x)
+
+cdef inline Py_ssize_t _gallop_right(const double[::1] t, double x, Py_ssize_t base) noexcept nogil:
+    """
+    Returns the index of the first time greater than x, given that it is past base;
+    the step doubles until it overshoots, so nearby positions are found quickly
+    """
+    cdef Py_ssize_t n = t.shape[0], step = 1
+    
+    while base + step < n and t[base + step] <= x:
+        base += step
+        step <<= 1
+        
+    return _search_right(t, x, base + 1, min(base + step + 1, n))
+
+def interp_linear(const double[::1] t, const cython.floating[::1] v, const double[::1] slope, 
+                  const double[::1] q):
+    """
+    Linearly interpolates the queries q against the sorted times t and values v,
+    clamping to the first/last value outside of the range of t and returning NaN
+    for NaN queries (like np.interp)
+    
+    slope holds the precomputed slopes between consecutive samples of t and v.
+    Sorted queries are fastest: each search gallops forward from the previous 
+    position instead of bisecting all of t
+    """
+    cdef Py_ssize_t n = t.shape[0], i, right = 0, left
+    cdef double x, previous = -np.inf
+    out = np.empty(q.shape[0], dtype=np.float64)
+    cdef double[::1] out_view = out
+    
+    with nogil:
+        for i in range(q.shape[0]):
+            x = q[i]
+            
+            # NaN queries interpolate to NaN and leave the search position alone
+            if isnan(x):
+                out_view[i] = NAN
+                continue
+            
+            if x < previous:
+                right = _search_right(t, x, 0, n)
+            elif right < n and t[right] <= x:
+                right = _gallop_right(t, x, right)
+            previous = x
+            
+            if right == n:
+                out_view[i] = v[n-1]
+            elif right == 0:
+                out_view[i] = v[0]
+            else:
+                left = right - 1
+                out_view[i] = v[left] + (x - t[left]) * slope[left]
+                
+    return out
@@ -1,24 +1,40 @@
-
 class LazyOperation:
     
+    __slots__ = ('_func', '_args', '_kwargs', '_cached', '_value')
+    
     def __init__(self, func, *args, **kwargs):
-        self.__func = func
-        self.__args = args
-        self.__kwargs = kwargs
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+        self._cached = False
+        self._value = None
+    
+    @classmethod
+    def identity(cls, value):
+        """
+        Returns an already evaluated LazyOperation whose eval returns value
+        """
+        operation = cls(None)
+        operation._cached = True
+        operation._value = value
+        
+        return operation
         
     def eval(self):
         """
         Recursively evaluate LazyOperation object
+
+        The result is cached, so repeated calls return it without evaluating
+        the operation (or any of its LazyOperation arguments) again
         """
-        arg_list = list(self.__args)
-        for i, arg in enumerate(self.__args):
-            if isinstance(arg, LazyOperation): 
-                arg_list[i] = arg.eval()
+        if self._cached:
+            return self._value
+        
+        args = [arg.eval() if isinstance(arg, LazyOperation) else arg for arg in self._args]
+        kwargs = {key: arg.eval() if isinstance(arg, LazyOperation) else arg 
+                  for key, arg in self._kwargs.items()}
+        
+        self._value = self._func(*args, **kwargs)
+        self._cached = True
         
-        self.__args = tuple(arg_list)
-                
-        for key in self.__kwargs:
-            if isinstance(self.__kwarg[key], LazyOperation):
-                self.__kwarg[key] = self.__kwarg[key].eval()
-                
-        return self.__func(*self.__args, **self.__kwargs)
\ No newline at end of file
+        return self._value
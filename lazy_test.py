@@ -1,7 +1,37 @@
+import unittest
 import timeseries as ts
 import lazy
 
 def add(a,b):
   return a+b
 def mul(a,b):
-  return a*b
\ No newline at end of file
+  return a*b
+
+class MyTest(unittest.TestCase):
+
+    def test_eval(self):
+        op = lazy.LazyOperation(add, lazy.LazyOperation(mul, 2, 3), 4)
+        self.assertEqual(op.eval(), 10)
+
+    def test_eval_kwargs(self):
+        op = lazy.LazyOperation(add, 1, b=lazy.LazyOperation(mul, a=2, b=3))
+        self.assertEqual(op.eval(), 7)
+
+    def test_eval_cached(self):
+        calls = []
+        def count(a):
+            calls.append(a)
+            return a
+        op = lazy.LazyOperation(count, 5)
+        self.assertEqual(op.eval(), 5)
+        self.assertEqual(op.eval(), 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_identity(self):
+        value = ts.TimeSeries([1,2,3], [4,5,6])
+        op = lazy.LazyOperation(add, lazy.LazyOperation.identity(2), 3)
+        self.assertIs(lazy.LazyOperation.identity(value).eval(), value)
+        self.assertEqual(op.eval(), 5)
+
+if __name__ == '__main__':
+    unittest.main()
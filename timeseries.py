@@ -1,7 +1,41 @@
 import reprlib
+import bisect
 import numpy as np
 from lazy import *
 
+# Interpolation kernels in order of preference: the compiled extension, 
+# then numba, falling back to plain NumPy when neither is available
+try:
+    from _tsutils import interp_linear as _interp_kernel
+except ImportError:
+    try:
+        from _interp_numba import _interp_kernel
+    except ImportError:
+        _interp_kernel = None
+
+def _stored_array(sequence, dtype):
+    """
+    Converts a sequence to the contiguous, read-only array stored by a TimeSeries,
+    returning it with whether its buffer is shared with the sequence
+    
+    Read-only arrays (such as the times or values of another series) are shared 
+    without a copy; writable arrays are copied, since changes made through them 
+    would go unnoticed by the cached results of the series
+    """
+    array = np.ascontiguousarray(sequence, dtype=dtype)
+    shared = array is sequence or not array.flags.owndata
+    
+    if shared and array.flags.writeable:
+        array = array.copy()
+        shared = False
+    elif shared:
+        # A view, so that the flags of the caller's array are left untouched
+        array = array.view()
+        
+    array.flags.writeable = False
+    
+    return array, shared
+
 class TimeSeries():
     
     '''
@@ -11,13 +45,17 @@ class TimeSeries():
     -----------
         - times: a list of time indexes
         - values: an list of corresponding values 
+          (arrays passed in are copied unless they are read-only, in which case
+          they are shared and must not be changed through another reference)
+        - dtype: the numpy dtype used to store the values, float64 (the default) 
+          or float32 (which halves the memory traffic of large series)
         
     Properties:
     -----------
         - times: returns a sequence of the times
         - values: returns a sequence of the values
         - items: returns a sequence of time, value tuples
-        - lazy: returns a LazyOperation instance which stores and identity function and the TimeSeries object
+        - lazy: returns an (already evaluated) identity LazyOperation instance for the TimeSeries object
         
     Methods:
     --------
@@ -31,15 +69,50 @@ class TimeSeries():
 
     '''
     
-    def __init__(self, times=[], values=None):
+    __slots__ = ('_times', '_values', '_slope', '_step', '_sum', '_median_cache', '_sorted', '_order', '_times_list',
+                 '_values_shared')
+    
+    def __init__(self, times=None, values=None, dtype=np.float64):
+        
+        if times is None:
+            times = ()
+        
+        # np.dtype(None) is float64, but ascontiguousarray(..., dtype=None) infers 
+        # the dtype, so None is rejected explicitly
+        if dtype is None or np.dtype(dtype) not in (np.float32, np.float64):
+            raise TypeError('TimeSeries values must be float32 or float64, not {}'.format(dtype))
+        
+        self._times, _ = _stored_array(times, np.float64)
         
-        if values==None:
-            values = np.zeros(len(times))
+        if values is None:
+            self._values = np.zeros(self._times.shape[0], dtype=dtype)
+            self._values.flags.writeable = False
+            values_shared = False
+        else:
+            self._values, values_shared = _stored_array(values, dtype)
             
-        assert len(times) == len(values), "Sequence of times does not match sequences of values."
+        assert self._times.shape == self._values.shape, "Sequence of times does not match sequences of values."
+        
+        # Whether the values buffer may be referenced outside of the series (by 
+        # the caller, or anyone handed it through values, iteration or NumPy), 
+        # in which case __setitem__ has to copy it before writing
+        self._values_shared = values_shared
+        
+        # Slopes between samples and the spacing of uniformly spaced times (0 if 
+        # they are not) used by interpolate, computed on first use
+        self._slope = None
+        self._step = None
         
-        self._times = np.array(times)
-        self._values = np.array(values)
+        # Sum of the values behind mean and the result of median, computed on 
+        # first use
+        self._sum = None
+        self._median_cache = None
+        
+        # Lookups bisect the times when they are sorted; for short series a plain 
+        # list is faster to bisect than the array is to searchsorted
+        self._sorted = bool(np.all(self._times[1:] >= self._times[:-1]))
+        self._times_list = self._times.tolist() if len(self._times) < 256 else None
+        self._order = None
         
     def __len__(self):
         """
@@ -47,27 +120,89 @@ class TimeSeries():
         """
         return len(self._times)
     
+    def _index(self, time):
+        """
+        Returns the index of a given time within the time series, or None if
+        the time is not present
+        """
+        if not self._sorted:
+            # Unsorted times are searched through a (stable) sorting permutation, 
+            # computed on first use, rather than compared against as a whole
+            if self._order is None:
+                self._order = np.argsort(self._times, kind='stable')
+            
+            position = np.searchsorted(self._times, time, sorter=self._order)
+            
+            if position < len(self._order) and self._times[self._order[position]] == time:
+                return self._order[position]
+            return None
+        
+        if self._times_list is not None:
+            index = bisect.bisect_left(self._times_list, time)
+            found = index < len(self._times_list) and self._times_list[index] == time
+        else:
+            index = np.searchsorted(self._times, time)
+            found = index < len(self._times) and self._times[index] == time
+            
+        return index if found else None
+    
+    def _indices(self, time):
+        """
+        Returns the indexes of every sample at a given time (there may be several
+        if times repeat) as a slice or index array, or None if the time is not present
+        """
+        index = self._index(time)
+        
+        if index is None:
+            return None
+        
+        if not self._sorted:
+            start = np.searchsorted(self._times, time, sorter=self._order)
+            stop = np.searchsorted(self._times, time, side='right', sorter=self._order)
+            return self._order[start:stop]
+        
+        if self._times_list is not None:
+            stop = bisect.bisect_right(self._times_list, time)
+        else:
+            stop = np.searchsorted(self._times, time, side='right')
+            
+        return slice(index, stop)
+    
     def __getitem__(self, time):
         """
         Returns the corresponding value for a given time within the time series
         """       
-        index = np.where(self._times==time)[0]
+        index = self._index(time)
         
-        if len(index) == 0:
+        if index is None:
             raise ValueError('Time ({}) not in TimeSeries'.format(time))
         
-        return self._values[index[0]]
+        return self._values[index]
     
     def __setitem__(self, time, value):
         """
         Sets the value of a given time if the time is present with in the time series
+        (for repeated times, every sample at that time is set)
         """
-        index = np.where(self._times==time)[0]
+        index = self._indices(time)
         
-        if len(index) == 0:
+        if index is None:
             raise ValueError('Time ({}) not in TimeSeries'.format(time))
         
+        # Copy if the buffer has been handed out, so other holders (and the 
+        # cached results of other series built on it) never see the write
+        if self._values_shared:
+            self._values = self._values.copy()
+            self._values_shared = False
+        else:
+            self._values.flags.writeable = True
+        
         self._values[index] = value
+        self._values.flags.writeable = False
+        
+        self._slope = None
+        self._sum = None
+        self._median_cache = None
         
         
     def __str__(self):
@@ -80,11 +215,11 @@ class TimeSeries():
         name = type(self).__name__
         
         if len(self) <= 5:
-            all_samples = [(t, v) for t, v in zip(self._times,self._values)]
+            all_samples = self.items
             return "{} {} ({} Samples)".format(name, all_samples, len(self))
         else:
-            first_sample = (self._times[0],self._values[0])
-            last_sample = (self._times[-1], self._values[-1])
+            first_sample = (self._times[0].item(), self._values[0].item())
+            last_sample = (self._times[-1].item(), self._values[-1].item())
             return "{} [{}...{}] ({} Samples)".format(name, first_sample, last_sample, len(self))
         
     def __repr__(self):
@@ -97,35 +232,79 @@ class TimeSeries():
         name = type(self).__name__
         
         if len(self) <= 5:
-            all_samples = [(t, v) for t, v in zip(self._times,self._values)]
+            all_samples = self.items
             return "{}({})".format(name, all_samples, len(self))
         else:
-            first_sample = (self._times[0],self._values[0])
-            last_sample = (self._times[-1], self._values[-1])
+            first_sample = (self._times[0].item(), self._values[0].item())
+            last_sample = (self._times[-1].item(), self._values[-1].item())
             return "{}({}...{})".format(name, first_sample, last_sample, len(self))
         
     def __contains__(self, time):
-        return (time in self._times)
+        return self._index(time) is not None
     
     def __iter__(self):
-        for value in self._values:
-            yield value
+        self._values_shared = True
+        return iter(self._values)
             
     def __eq__(self, ts):
-        return self.items == ts.items
+        return (len(self) == len(ts) 
+                and np.array_equal(self._times, ts._times) 
+                and np.array_equal(self._values, ts._values))
+    
+    def __array__(self, dtype=None, copy=None):
+        """
+        Returns the values of the time series to NumPy, without copying unless 
+        a copy or a different dtype is requested
+        """
+        if copy:
+            return np.array(self._values, dtype=dtype, copy=True)
+        
+        if copy is False and dtype is not None and np.dtype(dtype) != self._values.dtype:
+            raise ValueError('Unable to avoid a copy converting TimeSeries values to {}'.format(np.dtype(dtype)))
+        
+        self._values_shared = True
+        return np.asarray(self._values, dtype=dtype)
+    
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        """
+        Applies a NumPy ufunc to the values of the time series 
+        
+        Elementwise calls with floating results return a new TimeSeries sharing
+        the same times, while other results (e.g. comparisons, or reductions 
+        such as np.add.reduce) are returned as they are
+        """
+        if any(isinstance(out, TimeSeries) for out in kwargs.get('out', ())):
+            return NotImplemented
+        
+        args = []
+        for arg in inputs:
+            if isinstance(arg, TimeSeries):
+                if not np.array_equal(arg._times, self._times):
+                    raise ValueError('Times of TimeSeries operands do not match')
+                arg = arg._values
+            args.append(arg)
+            
+        result = getattr(ufunc, method)(*args, **kwargs)
+        
+        if (method == '__call__' and ufunc.nout == 1 and np.shape(result) == self._times.shape
+                and np.issubdtype(result.dtype, np.floating)):
+            return TimeSeries(self._times, result, dtype=result.dtype)
+        
+        return result
             
     @property
     def times(self):
         """
-        Returns a sequence of the times within time series object
+        Returns a (read-only) sequence of the times within time series object
         """
         return self._times
     
     @property
     def values(self): 
         """
-        Returns a sequence of the values within time series object
+        Returns a (read-only) sequence of the values within time series object
         """
+        self._values_shared = True
         return self._values
     
     @property
@@ -133,65 +312,154 @@ class TimeSeries():
         """
         Returns a sequence of time, value tuples within time series object
         """
-        return [(t,v) for t,v in zip(self._times,self._values)]
+        return list(zip(self._times.tolist(), self._values.tolist()))
     
     @property 
     def lazy(self):
         """
-        Return a new LazyOperation instance using an identity function and 
-        self as the only argument. This wraps up the TimeSeries instance 
-        and a function which does nothing and saves them both for later.
+        Return a new LazyOperation instance which evaluates to self. Since the 
+        operation is the identity, it is created already evaluated, so eval 
+        just returns the TimeSeries instance without calling anything.
         """ 
-        def func(self):
-            return self
+        return LazyOperation.identity(self)
+    
+    def _slopes(self):
+        """
+        Returns the slopes between consecutive samples, computing them on first use
+        """
+        if self._slope is None:
+            # Duplicated times give infinite/NaN slopes, which interpolation never uses
+            with np.errstate(divide='ignore', invalid='ignore'):
+                self._slope = np.diff(self._values) / np.diff(self._times)
+        
+        return self._slope
+    
+    def _uniform_step(self):
+        """
+        Returns the spacing between the times if they are uniformly spaced and 0
+        otherwise, computing it on first use
+        """
+        if self._step is None:
+            deltas = np.diff(self._times)
+            step = float(deltas[0]) if len(deltas) else 0.0
+            uniform = step > 0 and np.allclose(deltas, step, rtol=1e-9, atol=0)
+            self._step = step if uniform else 0.0
+            
+        return self._step
+    
+    def _interpolate_uniform(self, queries):
+        """
+        Interpolates against uniformly spaced times, where the sample preceding
+        each query is found arithmetically rather than by searching
+        """
+        slope = self._slopes()
+        clipped = np.clip(queries, self._times[0], self._times[-1])
+        
+        # NaN queries get an arbitrary index; their values still come out NaN
+        position = (clipped - self._times[0]) / self._step
+        index = np.nan_to_num(position, copy=False).astype(np.intp)
+        np.clip(index, 0, len(slope) - 1, out=index)
         
-        return LazyOperation(func, self)
+        # Rounding in the division (or spacing that is only nearly uniform) can 
+        # land one sample off, so step back or forward where needed
+        index -= self._times[index] > clipped
+        index += (index < len(slope) - 1) & (self._times[index + 1] <= clipped)
+        
+        return self._values[index] + (clipped - self._times[index]) * slope[index]
     
     def interpolate(self, times):
         """
         Takes a sequence of times and returns a new time series object with 
         values that are generated from the values within the current time series object
         """
-        values = []
+        queries = np.ascontiguousarray(times, dtype=np.float64)
         
-        for time in times:
-            
-            right_index = np.searchsorted(self._times, time, side='right')
-            
-            if right_index == len(self):
-                values.append(self._values[-1])
-                continue
-            
-            if right_index == 0:
-                values.append(self._values[0])
-                continue
-                    
-            left_index = right_index - 1
-
-            time_delta = float(self._times[right_index] - self._times[left_index])            
-            val_delta = float(self._values[right_index] - self._values[left_index])
-            
-            slope = time_delta / val_delta
-            step = (time - self._times[left_index]) / slope
+        if len(self) < 2:
+            values = np.interp(queries, self._times, self._values)
+            return TimeSeries(times, values, dtype=self._values.dtype)
+        
+        # Written so that NaNs (which compare False) count as unsorted, letting 
+        # argsort move them to the end
+        unsorted = not np.all(queries[1:] >= queries[:-1])
+        
+        # Uniformly spaced times need no search at all, which beats sorting the 
+        # queries for (or going without) a compiled kernel
+        if self._uniform_step() and (unsorted or _interp_kernel is None):
+            return TimeSeries(times, self._interpolate_uniform(queries), dtype=self._values.dtype)
+        
+        # Sorted queries make the binary searches below hit neighbouring 
+        # positions, so we sort (if needed) and scatter the values back after
+        order = None
+        if unsorted:
+            order = np.argsort(queries, kind='stable')
+            queries = queries[order]
+        
+        if _interp_kernel is not None:
+            values = _interp_kernel(self._times, self._values, self._slopes(), queries)
+        else:
+            # Queries outside of the times (including at duplicated end times) 
+            # take the first/last value, like the kernels; the rest interpolate 
+            # from the sample at or before them, whose slope is always finite
+            slope = self._slopes()
+            right = np.searchsorted(self._times, queries, side='right')
+            values = np.where(right == 0, self._values[0], self._values[-1]).astype(np.float64)
             
-            values.append(self._values[left_index]+step)
+            inside = (right > 0) & (right < len(self))
+            left = right[inside] - 1
+            values[inside] = self._values[left] + (queries[inside] - self._times[left]) * slope[left]
+            values[np.isnan(queries)] = np.nan
             
-        return TimeSeries(times, values)
+        if order is not None:
+            unsorted_values = np.empty_like(values)
+            unsorted_values[order] = values
+            values = unsorted_values
+        
+        return TimeSeries(times, values, dtype=self._values.dtype)
     
-    def mean(self):
-        return np.mean(self._values)
+    def mean(self, axis=None, dtype=None, out=None):
+        """
+        Returns the mean of the values; the arguments let np.mean(ts) call this
+        method, but only the whole series is supported (axis and out must be None)
+        """
+        if axis is not None or out is not None:
+            raise ValueError('TimeSeries.mean does not support axis or out')
+        
+        if self._sum is None:
+            # Accumulate in float64 even when the values are stored with less precision
+            self._sum = np.sum(self._values, dtype=np.float64)
+        
+        mean = float(self._sum / len(self))
+        
+        return mean if dtype is None else np.dtype(dtype).type(mean)
     
     def median(self):
-        return np.median(self._values)
+        if self._median_cache is None:
+            n = len(self)
+            k = n // 2
+            
+            # Partitioning finds the middle order statistic(s) without a full sort;
+            # it moves NaNs to the end, where they make the median NaN (as np.median)
+            if n == 0:
+                self._median_cache = np.nan
+            else:
+                partitioned = np.partition(self._values, k if n % 2 else (k - 1, k))
+                
+                if np.isnan(partitioned[-1]):
+                    self._median_cache = np.nan
+                elif n % 2:
+                    self._median_cache = float(partitioned[k])
+                else:
+                    self._median_cache = 0.5 * (float(partitioned[k - 1]) + float(partitioned[k]))
+        
+        return self._median_cache
     
     def itertimes(self):
-        for time in self.times:
-            yield time
+        return iter(self._times)
             
     def itervalues(self):
-        for value in self.values:
-            yield value
+        self._values_shared = True
+        return iter(self._values)
             
     def iteritems(self):
-        for item in self.items:
-            yield item
\ No newline at end of file
+        self._values_shared = True
+        return zip(self._times, self._values)
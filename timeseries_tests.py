@@ -1,5 +1,6 @@
 import unittest
-import types
+import collections.abc
+from unittest import mock
 import numpy as np
 from timeseries import *
 
@@ -12,6 +13,18 @@ class MyTest(unittest.TestCase):
         with self.assertRaises(AssertionError):
             ts = TimeSeries(times, values)
             
+    def test_dtype(self):
+        times = list(range(10))
+        values = np.random.rand(len(times))
+        ts = TimeSeries(times, values, dtype=np.float32)
+        self.assertEqual(ts.values.dtype, np.float32)
+        self.assertEqual(ts.interpolate([0.5]).values.dtype, np.float32)
+        self.assertAlmostEqual(ts.mean(), np.mean(values), places=5)
+        for dtype in (np.int64, np.float16, np.longdouble, None):
+            with self.assertRaises(TypeError):
+                TimeSeries(times, values, dtype=dtype)
+        self.assertEqual(TimeSeries(times, values, dtype='float32').values.dtype, np.float32)
+            
     def test_len(self):
         times = list(range(10))
         values = np.random.rand(len(times))
@@ -39,6 +52,83 @@ class MyTest(unittest.TestCase):
         ts[right_time] = new_value
         self.assertEqual(ts[right_time], new_value)
     
+    def test_unsorted_times(self):
+        ts = TimeSeries([3,1,2], [30,10,20])
+        self.assertEqual(ts[1], 10)
+        self.assertTrue(2 in ts)
+        self.assertFalse(4 in ts)
+        ts[3] = 5
+        self.assertEqual(ts[3], 5)
+        with self.assertRaises(ValueError):
+            ts[4] = 5
+        
+    def test_readonly(self):
+        times = np.arange(10, dtype=np.float64)
+        values = np.random.rand(len(times))
+        ts = TimeSeries(times, values)
+        with self.assertRaises(ValueError):
+            ts.values[0] = 10
+        with self.assertRaises(ValueError):
+            ts.times[0] = 10
+        # Setting an item copies rather than writing into the caller's array
+        old_value = values[4]
+        ts[4] = 10
+        self.assertEqual(ts[4], 10)
+        self.assertEqual(values[4], old_value)
+        self.assertTrue(values.flags.writeable)
+        
+    def test_caller_arrays(self):
+        # Writable arrays are copied, so later changes do not reach the series
+        times = np.array([0.,1.,2.])
+        values = np.array([1.,2.,3.])
+        ts = TimeSeries(times, values)
+        self.assertEqual(ts.mean(), 2)
+        times[1] = 5
+        values[0] = 100
+        self.assertTrue(1 in ts)
+        self.assertFalse(5 in ts)
+        self.assertEqual(ts.mean(), 2)
+        self.assertEqual(ts.values[0], 1)
+        # ufunc results written into a caller's out array are copied as well
+        out = np.empty(3)
+        doubled = np.multiply(ts, 2, out=out)
+        out[0] = 100
+        self.assertEqual(doubled.values[0], 2)
+        # Read-only arrays, like those of another series, are shared
+        other = TimeSeries(ts.times, ts.values)
+        self.assertTrue(np.shares_memory(other.times, ts.times))
+        self.assertTrue(np.shares_memory(other.values, ts.values))
+    
+    def test_setitem_shared_values(self):
+        a = TimeSeries([0,1,2], [1,2,3])
+        a[0] = 1
+        b = TimeSeries(a.times, a.values)
+        self.assertEqual(b.mean(), 2)
+        self.assertEqual(b.median(), 2)
+        a[1] = 100
+        self.assertEqual(a[1], 100)
+        self.assertListEqual(list(b.values), [1,2,3])
+        self.assertEqual(b.mean(), 2)
+        self.assertEqual(b.median(), 2)
+        # Values handed to NumPy are not written through either
+        values = np.asarray(a)
+        a[2] = 7
+        self.assertListEqual(list(values), [1,100,3])
+    
+    def test_setitem_duplicate_times(self):
+        ts = TimeSeries([0,1,1,2], [1,2,3,4])
+        ts[1] = 9
+        self.assertListEqual(list(ts.values), [1,9,9,4])
+        self.assertEqual(ts[1], 9)
+        ts = TimeSeries([1,0,2,1], [1,2,3,4])
+        ts[1] = 9
+        self.assertListEqual(list(ts.values), [9,2,3,9])
+        long_times = np.repeat(np.arange(200), 2)
+        ts = TimeSeries(long_times, np.zeros(len(long_times)))
+        ts[150] = 9
+        self.assertEqual(ts.values.sum(), 18)
+        self.assertEqual(ts[150], 9)
+    
     def test_contains(self):
         times = list(range(10))
         values = np.random.rand(len(times))
@@ -55,15 +145,66 @@ class MyTest(unittest.TestCase):
         ts2 = TimeSeries(times, values)
         self.assertEqual(ts1, ts2)
             
+    def test_array(self):
+        times = list(range(10))
+        values = np.random.rand(len(times))
+        ts = TimeSeries(times, values)
+        self.assertTrue(np.shares_memory(np.asarray(ts), ts.values))
+        self.assertEqual(np.median(ts), np.median(values))
+        self.assertEqual(np.mean(ts), np.mean(values))
+        with self.assertRaises(ValueError):
+            np.mean(ts, axis=0)
+        self.assertTrue(np.shares_memory(np.array(ts, copy=False), ts.values))
+        with self.assertRaises(ValueError):
+            np.array(ts, dtype=np.float32, copy=False)
+        
+    def test_ufunc(self):
+        times = list(range(10))
+        values = np.random.rand(len(times))
+        ts = TimeSeries(times, values)
+        self.assertEqual(np.log(ts), TimeSeries(times, np.log(values)))
+        self.assertEqual(np.add(ts, ts), TimeSeries(times, 2*values))
+        self.assertEqual(np.add.reduce(ts), np.add.reduce(values))
+        np.testing.assert_array_equal(np.greater(ts, 0.5), values > 0.5)
+        with self.assertRaises(ValueError):
+            np.add(ts, TimeSeries(times[::-1], values))
+            
     def test_interpolate(self):
         a = TimeSeries([0,5,10], [1,2,3])
         b = TimeSeries([2.5,7.5], [100, -100])
         # Simple cases
         self.assertEqual(a.interpolate([1]), TimeSeries([1],[1.2]))
         self.assertEqual(a.interpolate(b.times), TimeSeries([2.5,7.5], [1.5, 2.5]))
+        # Unsorted times
+        self.assertEqual(a.interpolate([7.5,1,2.5]), TimeSeries([7.5,1,2.5], [2.5,1.2,1.5]))
         # Boundary conditions
         self.assertEqual(a.interpolate([-100,100]), TimeSeries([-100,100],[1,3]))
     
+    def test_interpolate_duplicate_times(self):
+        a = TimeSeries([0,0,1,1], [1,2,3,4])
+        queries = [-1,0,0.5,1,2]
+        expected = np.interp(queries, a.times, a.values)
+        np.testing.assert_allclose(a.interpolate(queries).values, expected)
+        # The NumPy fallback used when no compiled kernel is available
+        with mock.patch('timeseries._interp_kernel', None):
+            np.testing.assert_allclose(a.interpolate(queries).values, expected)
+            np.testing.assert_allclose(a.interpolate([5,np.nan,1]).values, [4,np.nan,4])
+            np.testing.assert_allclose(TimeSeries([0,1,1],[0,1,5]).interpolate([1,2]).values, [5,5])
+        
+    def test_interpolate_nan(self):
+        a = TimeSeries([0,3,10], [.1,.7,.3])
+        np.testing.assert_allclose(a.interpolate([5,np.nan,1]).values, [0.58571429,np.nan,0.3])
+        # Uniformly spaced times
+        b = TimeSeries([0,1,2], [1,2,3])
+        np.testing.assert_allclose(b.interpolate([0.5,np.nan,2]).values, [1.5,np.nan,3])
+        
+    def test_interpolate_uniform(self):
+        times = np.arange(0, 1, 0.1)
+        values = np.random.rand(len(times))
+        ts = TimeSeries(times, values)
+        queries = np.concatenate([times, np.random.rand(100)*1.2 - 0.1])
+        np.testing.assert_allclose(ts.interpolate(queries).values, np.interp(queries, times, values))
+    
     def test_lazy(self):
         times = list(range(10))
         values = np.random.rand(len(times))
@@ -75,21 +216,21 @@ class MyTest(unittest.TestCase):
         values = np.random.rand(len(times))
         ts = TimeSeries(times, values)
         self.assertListEqual(list(ts.itertimes()), times)
-        self.assertIsInstance(ts.itertimes(), types.GeneratorType)
+        self.assertIsInstance(ts.itertimes(), collections.abc.Iterator)
         
     def test_itervalues(self):
         times = list(range(10))
         values = list(np.random.rand(len(times)))
         ts = TimeSeries(times, values)
         self.assertListEqual(list(ts.itervalues()), values)
-        self.assertIsInstance(ts.itervalues(), types.GeneratorType)
+        self.assertIsInstance(ts.itervalues(), collections.abc.Iterator)
         
     def test_iteritems(self):
         times = list(range(10))
         values = np.random.rand(len(times))
         ts = TimeSeries(times, values)
         self.assertListEqual(list(ts.iteritems()), list(zip(times,values)))
-        self.assertIsInstance(ts.iteritems(), types.GeneratorType)
+        self.assertIsInstance(ts.iteritems(), collections.abc.Iterator)
     
     def test_mean(self):
         times = list(range(10))
@@ -102,6 +243,27 @@ class MyTest(unittest.TestCase):
         values = np.random.rand(len(times))
         ts = TimeSeries(times, values)
         self.assertEqual(ts.median(), np.median(values))
+        
+    def test_mean_median_nan(self):
+        for values in ([1,np.nan,3], [1,np.nan,3,4], [np.nan]):
+            ts = TimeSeries(range(len(values)), values)
+            self.assertTrue(np.isnan(ts.median()))
+            self.assertTrue(np.isnan(ts.mean()))
+        
+    def test_mean_median_after_setitem(self):
+        ts = TimeSeries([0,1,2], [1,2,3])
+        self.assertEqual(ts.mean(), 2)
+        self.assertEqual(ts.median(), 2)
+        ts[2] = 9
+        self.assertEqual(ts.mean(), 4)
+        self.assertEqual(ts.median(), 2)
+        ts[1] = 5
+        self.assertEqual(ts.median(), 5)
+        # Large values cancelling out must not lose precision
+        ts = TimeSeries([0,1], [1e16,1.])
+        ts.mean()
+        ts[0] = 0
+        self.assertEqual(ts.mean(), 0.5)
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file